@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import (
+    Any,
+    Callable,
+    List,
+    TypeVar,
+)
+
+import asyncio
+import concurrent.futures
+import pathlib
+import sqlite3
+import threading
+
+
+T = TypeVar("T")
+
+
+# WAL lets readers proceed while a write is in progress, and in WAL mode
+# synchronous=NORMAL is still safe against corruption (only the last
+# commits may be lost on power failure).  The page cache is per
+# connection, so give each one about 20MB.
+_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-20000;
+"""
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    conn.executescript(_PRAGMAS)
+
+
+def connect(database: str, **kwargs: Any) -> sqlite3.Connection:
+    conn: sqlite3.Connection = sqlite3.connect(database, **kwargs)
+    configure_connection(conn)
+    return conn
+
+
+def is_file_database(database: str) -> bool:
+    # In-memory and temporary databases are private to the connection
+    # that opened them, so they cannot be shared across threads.
+    return database not in ("", ":memory:")
+
+
+# Runs SQLite queries on worker threads, with a connection per thread.
+# Read-only pools open their connections with mode=ro, so a stray write
+# fails instead of contending with the writer for the database lock.
+class ConnectionPool:
+    def __init__(
+        self,
+        database: str,
+        max_workers: int = 4,
+        *,
+        readonly: bool = False,
+    ) -> None:
+        self._database = database
+        self._readonly = readonly
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="libvirt-aws-db",
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            # Closed from the loop thread in close().
+            if self._readonly:
+                uri = pathlib.Path(self._database).absolute().as_uri()
+                conn = connect(
+                    f"{uri}?mode=ro", uri=True, check_same_thread=False
+                )
+            else:
+                conn = connect(self._database, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, fn: Callable[..., T], args: tuple[Any, ...]) -> T:
+        return fn(self._connection(), *args)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+# Stands in for a ConnectionPool when the database is not a file, running
+# queries inline on the one connection that can see it.
+class SharedConnection:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        return fn(self._conn, *args)
+
+    def close(self) -> None:
+        # The connection is owned and closed by the caller.
+        pass
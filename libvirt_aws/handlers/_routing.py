@@ -17,13 +17,13 @@ from typing import (
 )
 
 import functools
-import traceback
-import uuid
+import itertools
+import os
+import sys
 from xml.dom import minidom
 
 from aiohttp import web
 import aiohttp.log
-import dicttoxml
 import multidict
 import libvirt
 
@@ -31,13 +31,49 @@ import libvirt
 App = web.Application
 routes = web.RouteTableDef()
 
+# web.Response copies the headers it is given, so a single instance can
+# be shared by all responses.
+_xml_response_headers = multidict.CIMultiDict(
+    {"Content-Type": "text/xml; charset=utf-8"}
+)
 
-def _format_condensed_list(parent: str) -> str:
-    return parent[:-1]
 
+_xml_escapes = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "'": "&apos;",
+    }
+)
 
-def _format_expanded_list(parent: str) -> str:
-    return "item"
+
+def _emit_xml(
+    buf: List[str],
+    tag: str,
+    value: Any,
+    condensed: bool,
+) -> None:
+    if isinstance(value, str):
+        buf.append(f"<{tag}>{value.translate(_xml_escapes)}</{tag}>")
+    elif isinstance(value, bool):
+        buf.append(f"<{tag}>{'true' if value else 'false'}</{tag}>")
+    elif isinstance(value, (int, float)):
+        buf.append(f"<{tag}>{value}</{tag}>")
+    elif value is None:
+        buf.append(f"<{tag}></{tag}>")
+    elif isinstance(value, Mapping):
+        buf.append(f"<{tag}>")
+        for k, v in value.items():
+            _emit_xml(buf, k, v, condensed)
+        buf.append(f"</{tag}>")
+    else:
+        item_tag = tag[:-1] if condensed else "item"
+        buf.append(f"<{tag}>")
+        for item in value:
+            _emit_xml(buf, item_tag, item, condensed)
+        buf.append(f"</{tag}>")
 
 
 def format_xml_response(
@@ -46,24 +82,39 @@ def format_xml_response(
     xmlns: Optional[str] = None,
     list_format: Literal["condensed", "expanded"] = "expanded",
 ) -> str:
-    bbody = dicttoxml.dicttoxml(
-        data,
-        root=False,
-        attr_type=False,
-        item_func=(
-            _format_condensed_list
-            if list_format == "condensed"
-            else _format_expanded_list
-        ),
-    )
-    body = bbody.decode("utf-8")
+    condensed = list_format == "condensed"
+    buf = ['<?xml version="1.0" encoding="UTF-8"?>\n']
     if root is not None:
-        if xmlns is not None:
-            rootxml = f'<{root} xmlns="{xmlns}">'
-        else:
-            rootxml = f"<{root}>"
-        body = f"{rootxml}\n{body}\n</{root}>"
-    return f'<?xml version="1.0" encoding="UTF-8"?>\n{body}'
+        open_tag, close_tag = _root_tags(root, xmlns)
+        buf.append(open_tag)
+    for k, v in data.items():
+        _emit_xml(buf, k, v, condensed)
+    if root is not None:
+        buf.append(close_tag)
+    return "".join(buf)
+
+
+@functools.lru_cache(maxsize=1024)
+def _root_tags(root: str, xmlns: Optional[str]) -> Tuple[str, str]:
+    if xmlns is not None:
+        open_tag = f'<{root} xmlns="{xmlns.translate(_xml_escapes)}">\n'
+    else:
+        open_tag = f"<{root}>\n"
+    return open_tag, f"\n</{root}>"
+
+
+@functools.lru_cache(maxsize=64)
+def _ec2_xmlns(version: str) -> str:
+    return f"http://ec2.amazonaws.com/doc/{version}/"
+
+
+# Defers XML pretty-printing until a log record is actually emitted.
+class _PrettyXML:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def __str__(self) -> str:
+        return minidom.parseString(self.text).toprettyxml()
 
 
 class ServiceError(web.HTTPError):
@@ -83,11 +134,18 @@ class ServiceError(web.HTTPError):
         super().__init__(content_type="text/xml", **kwargs)
 
 
+def new_request_id() -> str:
+    # Same shape as str(uuid.uuid4()), minus the UUID object round trip.
+    # Clients treat request ids as opaque, so version bits are not set.
+    h = os.urandom(16).hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
 def format_ec2_error_xml(err: ServiceError) -> str:
     return format_xml_response(
         {
             "Response": {
-                "RequestID": str(uuid.uuid4()),
+                "RequestID": new_request_id(),
                 "Errors": {
                     "Error": {
                         "Code": err.code,
@@ -142,10 +200,15 @@ T = TypeVar("T")
 
 class SparseList(Generic[T], List[Optional[T]]):
     def __setitem__(self, index: int, value: T) -> None:  # type: ignore
-        gap = index - len(self) + 1
-        if gap > 0:
-            self.extend([None] * gap)
-        super().__setitem__(index, value)
+        gap = index - len(self)
+        if gap >= 0:
+            # Growing: pad the hole and append instead of padding with an
+            # extra slot only to overwrite it.
+            if gap:
+                self.extend(itertools.repeat(None, gap))
+            self.append(value)
+        else:
+            super().__setitem__(index, value)
 
 
 HandlerArgs = Dict[str, Any]
@@ -158,13 +221,18 @@ _HandlerType = Callable[
 
 class _HandlerData(NamedTuple):
     handler: _HandlerType
+    root: str
     xmlns: Optional[str]
     list_format: Literal["condensed", "expanded"]
     error_formatter: Callable[[ServiceError], str]
     include_request_id: bool
+    include_body: bool
 
 
-_handlers: Dict[Tuple[str, str], _HandlerData] = {}
+# Keyed by HTTP method first and then by action name, so that dispatch
+# does not need to build a composite key for every request.
+_handlers: Dict[str, Dict[str, _HandlerData]] = {}
+_no_handlers: Mapping[str, _HandlerData] = {}
 _path_handlers: Set[Tuple[str, str]] = set()
 
 
@@ -179,18 +247,22 @@ def handler(
 ) -> Callable[[_HandlerType], _HandlerType]:
     if isinstance(methods, str):
         methods = (methods,)
+    # Interned keys let registry lookups short-circuit on identity.
+    action = sys.intern(action)
+    methods = tuple(sys.intern(m) for m in methods)
 
     def inner(handler: _HandlerType) -> _HandlerType:
-        global _handlers
         for method in methods:
-            key = (action, method)
-            if key not in _handlers:
-                _handlers[key] = _HandlerData(
+            method_handlers = _handlers.setdefault(method, {})
+            if action not in method_handlers:
+                method_handlers[action] = _HandlerData(
                     handler=handler,
+                    root=f"{action}Response",
                     xmlns=xmlns,
                     list_format=list_format,
                     error_formatter=error_formatter,
                     include_request_id=True,
+                    include_body=False,
                 )
                 if (method, path) not in _path_handlers:
                     routes.route(method, path)(handle_request)
@@ -215,25 +287,26 @@ def direct_handler(
 
     if isinstance(methods, str):
         methods = (methods,)
+    # Interned keys let registry lookups short-circuit on identity.
+    action = sys.intern(action)
+    methods = tuple(sys.intern(m) for m in methods)
 
     def inner(handler: _HandlerType) -> _HandlerType:
-        global _handlers
         for method in methods:
-            key = (action, method)
-            if key not in _handlers:
-                _handlers[key] = _HandlerData(
+            method_handlers = _handlers.setdefault(method, {})
+            if action not in method_handlers:
+                method_handlers[action] = _HandlerData(
                     handler=handler,
+                    root=f"{action}Response",
                     xmlns=xmlns,
                     list_format=list_format,
                     error_formatter=error_formatter,
                     include_request_id=False,
+                    include_body=True,
                 )
                 if (method, path) not in _path_handlers:
                     routes.route(method, path)(
-                        functools.partial(
-                            handle_request,
-                            action=action,
-                        )
+                        _make_direct_request_handler(method_handlers[action])
                     )
                     _path_handlers.add((method, path))
                 else:
@@ -251,8 +324,11 @@ Args = Union[
 ]
 
 
-def parse_args(data: Args) -> HandlerArgs:
-    args: HandlerArgs = {}
+def parse_args(
+    data: Args,
+    initial: Optional[Mapping[str, str]] = None,
+) -> HandlerArgs:
+    args: HandlerArgs = dict(initial) if initial else {}
 
     for k, v in data.items():
         if not isinstance(v, str):
@@ -261,49 +337,45 @@ def parse_args(data: Args) -> HandlerArgs:
                 f"must be a string."
             )
 
-        path = k.split(".")
-        path_len = len(path)
-        if path_len == 1:
+        if "." not in k:
             args[k] = v
-        else:
-            i = 0
-            ptr: Any = args
-            while i < path_len:
-                subkey: str | int
-                if path[i].isnumeric():
-                    subkey = int(path[i]) - 1
+            continue
+
+        # List indexes are 1-based in the query protocol.
+        path = [
+            int(seg) - 1 if seg.isdecimal() else seg for seg in k.split(".")
+        ]
+        last = len(path) - 1
+        ptr: Any = args
+        for i, subkey in enumerate(path):
+            try:
+                child = ptr[subkey]
+            except (KeyError, IndexError):
+                child = None
+
+            if child is None:
+                # Missing key, or a gap left by an out-of-order index.
+                if i == last:
+                    ptr[subkey] = v
+                    break
+                elif isinstance(path[i + 1], int):
+                    child = SparseList()
                 else:
-                    subkey = path[i]
-                i += 1
-                try:
-                    ptr = ptr[subkey]
-                except (KeyError, IndexError):
-                    if i == path_len:
-                        ptr[subkey] = v
-                        break
-                    elif path[i].isnumeric():
-                        ptr[subkey] = SparseList()
-                    else:
-                        ptr[subkey] = {}
-
-                    ptr = ptr[subkey]
+                    child = {}
+                ptr[subkey] = child
+
+            ptr = child
 
     return args
 
 
-async def handle_request(
-    request: web.Request,
-    *,
-    action: Optional[str] = None,
-) -> web.StreamResponse:
+async def handle_request(request: web.Request) -> web.StreamResponse:
     data: Args
 
     if request.method == "POST":
         data = await request.post()
-        body = await request.text()
     elif request.method in {"GET", "DELETE"}:
         data = request.query
-        body = ""
     else:
         raise InvalidMethodError(
             f"Method Not Allowed: {request.method}",
@@ -311,59 +383,86 @@ async def handle_request(
             allowed_methods=["GET", "POST"],
         )
 
-    if action is None:
-        action_arg = data.get("Action")
-        if not isinstance(action_arg, str):
-            raise InvalidActionError(f"Invalid Action: {action_arg!r}")
-        action = action_arg
+    action = data.get("Action")
+    if not isinstance(action, str):
+        raise InvalidActionError(f"Invalid Action: {action!r}")
 
-    handler_data = _handlers.get((action, request.method))
+    handler_data = _handlers.get(request.method, _no_handlers).get(action)
 
     if handler_data is None:
         raise InvalidActionError(
             f"The action {action} is not valid for this web service."
         )
 
-    args = dict(request.match_info)
-    args["BodyText"] = body
-    args.update(parse_args(data))
+    return await _handle_action(request, handler_data, data)
+
+
+def _make_direct_request_handler(
+    handler_data: _HandlerData,
+) -> Callable[[web.Request], Awaitable[web.StreamResponse]]:
+    # Direct routes are bound to a single method and action, so the
+    # handler can be resolved here, once, rather than on every request.
+    # Their input comes from the path, the query string and the raw body,
+    # there is no point in parsing the latter as a form.
+    async def handle_direct_request(
+        request: web.Request,
+    ) -> web.StreamResponse:
+        return await _handle_action(request, handler_data, request.query)
+
+    return handle_direct_request
+
+
+async def _handle_action(
+    request: web.Request,
+    handler_data: _HandlerData,
+    data: Args,
+) -> web.StreamResponse:
+    args = parse_args(data, request.match_info)
+    if handler_data.include_body:
+        if request.method == "POST":
+            args["BodyText"] = await request.text()
+        else:
+            args["BodyText"] = ""
 
     xmlns = handler_data.xmlns
 
     if xmlns is None:
         version = args.get("Version")
-        if version is not None:
-            xmlns = f"http://ec2.amazonaws.com/doc/{version}/"
+        if isinstance(version, str):
+            xmlns = _ec2_xmlns(version)
 
     try:
         result = await handler_data.handler(args, request.app)
 
         if handler_data.include_request_id:
-            result["RequestID"] = str(uuid.uuid4())
+            result["RequestID"] = new_request_id()
 
         text = format_xml_response(
             result,
-            root=f"{action}Response",
+            root=handler_data.root,
             xmlns=xmlns,
             list_format=handler_data.list_format,
         )
-        dom = minidom.parseString(text)
         aiohttp.log.access_logger.debug(
-            f"Response:\n---------\n{dom.toprettyxml()}"
+            "Response:\n---------\n%s", _PrettyXML(text)
+        )
+        return web.Response(
+            body=text.encode("utf-8"),
+            headers=_xml_response_headers,
         )
-        return web.Response(text=text, content_type="text/xml")
     except ServiceError as e:
-        e.text = handler_data.error_formatter(e)
-        dom = minidom.parseString(e.text)
+        e.text = text = handler_data.error_formatter(e)
         aiohttp.log.access_logger.debug(
-            f"Error Response:\n\n{dom.toprettyxml()}"
+            "Error Response:\n\n%s", _PrettyXML(text)
         )
         raise e
     except Exception:
-        exc = InternalServerError("\n" + traceback.format_exc())
-        exc.text = handler_data.error_formatter(exc)
-        dom = minidom.parseString(exc.text)
+        request.app["logger"].exception(
+            "unhandled error in %s %s", request.method, request.path_qs
+        )
+        exc = InternalServerError("An internal error has occurred.")
+        exc.text = text = handler_data.error_formatter(exc)
         aiohttp.log.access_logger.debug(
-            f"Error Response:\n\n{dom.toprettyxml()}"
+            "Error Response:\n\n%s", _PrettyXML(text)
         )
         raise exc from None
@@ -2,26 +2,34 @@ from __future__ import annotations
 from typing import (
     Any,
     Dict,
+    List,
 )
 
+import functools
+
 from . import _routing
 
 
+@functools.lru_cache(maxsize=None)
+def _availability_zones(region: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "optInStatus": "opt-in-not-required",
+            "zoneName": f"{region}{az}",
+            "zoneId": f"{region}{az}",
+            "zoneState": "available",
+            "regionName": region,
+        }
+        for az in ["a", "b", "c"]
+    ]
+
+
 @_routing.handler("DescribeAvailabilityZones")
 async def describe_availability_zones(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    region = app["region"]
+    # The outer dict must be fresh, the request id is added to it.
     return {
-        "availabilityZoneInfo": [
-            {
-                "optInStatus": "opt-in-not-required",
-                "zoneName": f"{region}{az}",
-                "zoneId": f"{region}{az}",
-                "zoneState": "available",
-                "regionName": region,
-            }
-            for az in ["a", "b", "c"]
-        ],
+        "availabilityZoneInfo": _availability_zones(app["region"]),
     }
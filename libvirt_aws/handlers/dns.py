@@ -2,18 +2,24 @@ from __future__ import annotations
 from typing import (
     Any,
     Dict,
+    FrozenSet,
+    Iterator,
     List,
+    Optional,
     Set,
     Tuple,
 )
 
+import asyncio
 import bisect
 import datetime
 import functools
+import operator
+import sqlite3
+import uuid
+from xml.etree import ElementTree
 
 import libvirt
-import xmltodict
-import uuid
 
 from . import _routing
 from .. import objects
@@ -26,7 +32,7 @@ def format_route53_error_xml(err: _routing.ServiceError) -> str:
     return _routing.format_xml_response(
         {
             "ErrorResponse": {
-                "RequestId": str(uuid.uuid4()),
+                "RequestId": _routing.new_request_id(),
                 "Error": {
                     "Code": err.code,
                     "Message": err.msg,
@@ -71,6 +77,83 @@ class NoSuchChangeError(_routing.NotFoundError):
 Zone = Tuple[str, str, str]
 
 
+# Sort key that orders DNS names by their labels from the root down.
+# Zone and record names change rarely, so keep the keys around.
+@functools.lru_cache(maxsize=4096)
+def _name_key(name: str) -> str:
+    return ".".join(reversed(name.split(".")))
+
+
+def _parse_request(body: str, root_tag: str) -> ElementTree.Element:
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        raise InvalidInputError("input is not valid") from None
+
+    # Requests are in the Route53 namespace, match on local names only.
+    for el in root.iter():
+        el.tag = el.tag.rpartition("}")[2]
+
+    if root.tag != root_tag:
+        raise InvalidInputError("input is not valid")
+
+    return root
+
+
+_PARSE_CHUNK_SIZE = 65536
+
+ElementPath = Tuple[str, ...]
+
+_CHANGE_BATCH: ElementPath = ("ChangeResourceRecordSetsRequest", "ChangeBatch")
+_CHANGE_BATCH_COMMENT: ElementPath = _CHANGE_BATCH + ("Comment",)
+_CHANGE_BATCH_CHANGE: ElementPath = _CHANGE_BATCH + ("Changes", "Change")
+_CHANGE_BATCH_PATHS: FrozenSet[ElementPath] = frozenset(
+    {_CHANGE_BATCH_COMMENT, _CHANGE_BATCH_CHANGE}
+)
+
+
+# Incremental version of _parse_request() for requests with many repeated
+# elements: yields each element found at one of the given paths once it
+# is complete and discards its contents afterwards, so the whole document
+# is never held as a tree.
+def _iterparse_request(
+    body: str,
+    paths: FrozenSet[ElementPath],
+) -> Iterator[Tuple[ElementPath, ElementTree.Element]]:
+    parser: ElementTree.XMLPullParser[ElementTree.Element]
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    path: List[str] = []
+
+    def _events() -> Iterator[Tuple[ElementPath, ElementTree.Element]]:
+        for event, el in parser.read_events():  # type: ignore [misc]
+            assert isinstance(el, ElementTree.Element)
+            if event == "start":
+                el.tag = el.tag.rpartition("}")[2]
+                path.append(el.tag)
+            else:
+                el_path = tuple(path)
+                path.pop()
+                if el_path in paths:
+                    yield el_path, el
+                    el.clear()
+
+    try:
+        for i in range(0, len(body), _PARSE_CHUNK_SIZE):
+            parser.feed(body[i : i + _PARSE_CHUNK_SIZE])
+            yield from _events()
+        parser.close()
+        yield from _events()
+    except ElementTree.ParseError:
+        raise InvalidInputError("input is not valid") from None
+
+
+def _required_text(el: ElementTree.Element, path: str) -> str:
+    text = el.findtext(path)
+    if text is None:
+        raise InvalidInputError("input is not valid")
+    return text
+
+
 route53_handler = functools.partial(
     _routing.direct_handler,
     xmlns=XMLNS,
@@ -88,25 +171,20 @@ async def create_hosted_zone(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
             "libvirt network does not define a domain"
         )
 
-    parsed = xmltodict.parse(args["BodyText"])
+    request = _parse_request(args["BodyText"], "CreateHostedZoneRequest")
 
-    try:
-        request = parsed["CreateHostedZoneRequest"]
-    except KeyError:
-        raise InvalidInputError("input is not valid") from None
-
-    name = request.get("Name")
+    name = request.findtext("Name")
     if not name:
         raise _routing.InvalidParameterError("missing required Name")
 
-    caller_ref = request.get("CallerReference")
+    caller_ref = request.findtext("CallerReference")
     if not caller_ref:
         raise _routing.InvalidParameterError(
             "missing required CallerReference"
@@ -117,29 +195,16 @@ async def create_hosted_zone(
             f"hosted zone name must end with .{domain}"
         )
 
-    zone_id = str(uuid.uuid4()).replace("-", "")
-    comment = request.get("Comment")
-    change_id = str(uuid.uuid4()).replace("-", "")
+    zone_id = uuid.uuid4().hex
+    comment = request.findtext("Comment") or None
+    change_id = uuid.uuid4().hex
     submitted_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
 
-    with app["db"]:
-        app["db"].execute(
-            f"""
-                INSERT INTO dns_zones (id, name, comment)
-                VALUES (?, ?, ?)
-            """,
-            [zone_id, name, comment],
-        )
-
-        app["db"].execute(
-            f"""
-                INSERT INTO dns_changes (id, submitted_at, comment)
-                VALUES (?, ?, ?)
-            """,
-            [change_id, submitted_at, comment],
-        )
+    await app["db_writer"].run(
+        _insert_zone, zone_id, name, comment, change_id, submitted_at
+    )
 
-    config = {
+    config: Dict[str, Any] = {
         "PrivateZone": False,
     }
 
@@ -166,6 +231,32 @@ async def create_hosted_zone(
     }
 
 
+def _insert_zone(
+    db: sqlite3.Connection,
+    zone_id: str,
+    name: str,
+    comment: Optional[str],
+    change_id: str,
+    submitted_at: str,
+) -> None:
+    with db:
+        db.execute(
+            f"""
+                INSERT INTO dns_zones (id, name, comment)
+                VALUES (?, ?, ?)
+            """,
+            [zone_id, name, comment],
+        )
+
+        db.execute(
+            f"""
+                INSERT INTO dns_changes (id, submitted_at, comment)
+                VALUES (?, ?, ?)
+            """,
+            [change_id, submitted_at, comment],
+        )
+
+
 @route53_handler(
     "UpdateHostedZoneComment",
     methods="POST",
@@ -179,7 +270,7 @@ async def update_hosted_zone(
     if not zone_id:
         raise _routing.InvalidParameterError("missing required Id")
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
@@ -189,31 +280,19 @@ async def update_hosted_zone(
     if zone_id == net.name:
         raise InvalidDomainNameError(f"zone {zone_id} cannot be updated")
 
-    zone = _get_subzone(zone_id, app)
+    subzones = await _get_subzones(app)
+    zone = _find_subzone(zone_id, subzones)
 
-    try:
-        parsed = xmltodict.parse(args["BodyText"])
-        request = parsed["UpdateHostedZoneCommentRequest"]
-    except (KeyError, ValueError):
-        raise InvalidInputError("input is not valid") from None
+    request = _parse_request(
+        args["BodyText"], "UpdateHostedZoneCommentRequest"
+    )
 
-    comment = request.get("Comment")
-    if comment == "":
-        comment = None
+    comment = request.findtext("Comment") or None
 
-    db = app["db"]
-    with db:
-        db.execute(
-            f"""
-                UPDATE dns_zones
-                SET comment = ?
-                WHERE id = ?
-            """,
-            [comment, zone_id],
-        )
+    await app["db_writer"].run(_update_zone_comment, zone_id, comment)
 
     caller_ref = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-    config = {
+    config: Dict[str, Any] = {
         "PrivateZone": False,
     }
     if comment:
@@ -224,12 +303,30 @@ async def update_hosted_zone(
             "Id": f"/hostedzone/{zone_id}",
             "Name": zone[1],
             "Config": config,
-            "ResourceRecordSetCount": len(_get_records(zone[1], net, app)),
+            "ResourceRecordSetCount": len(
+                _get_records(zone[1], net, {z[1] for z in subzones})
+            ),
             "CallerReference": caller_ref,
         },
     }
 
 
+def _update_zone_comment(
+    db: sqlite3.Connection,
+    zone_id: str,
+    comment: Optional[str],
+) -> None:
+    with db:
+        db.execute(
+            f"""
+                UPDATE dns_zones
+                SET comment = ?
+                WHERE id = ?
+            """,
+            [comment, zone_id],
+        )
+
+
 @route53_handler(
     "DeleteHostedZone",
     methods="DELETE",
@@ -238,12 +335,22 @@ async def update_hosted_zone(
 async def delete_hosted_zone(
     args: _routing.HandlerArgs,
     app: _routing.App,
+) -> Dict[str, Any]:
+    # Keeps ChangeResourceRecordSets from adding records to the zone
+    # between the emptiness check and the delete.
+    async with app["libvirt_net_lock"]:
+        return await _delete_hosted_zone(args, app)
+
+
+async def _delete_hosted_zone(
+    args: _routing.HandlerArgs,
+    app: _routing.App,
 ) -> Dict[str, Any]:
     zone_id = args.get("Id")
     if not zone_id:
         raise _routing.InvalidParameterError("missing required Id")
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
@@ -253,18 +360,39 @@ async def delete_hosted_zone(
     if zone_id == net.name:
         raise InvalidDomainNameError(f"zone {zone_id} cannot be deleted")
     else:
-        zone_tuple = _get_subzone(zone_id, app)
-        records = _get_records(zone_tuple[1], net, app, include_soa_ns=False)
+        subzones = await _get_subzones(app)
+        zone_tuple = _find_subzone(zone_id, subzones)
+        records = _get_records(
+            zone_tuple[1],
+            net,
+            {z[1] for z in subzones},
+            include_soa_ns=False,
+        )
         if records:
             raise HostedZoneNotEmptyError(
                 f"zone {zone_id} contains resource records"
             )
 
-    change_id = str(uuid.uuid4()).replace("-", "")
+    change_id = uuid.uuid4().hex
     submitted_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
 
-    db = app["db"]
+    await app["db_writer"].run(_delete_zone, zone_id, change_id, submitted_at)
+
+    return {
+        "ChangeInfo": {
+            "Id": change_id,
+            "Status": "INSYNC",
+            "SubmittedAt": submitted_at,
+        },
+    }
+
 
+def _delete_zone(
+    db: sqlite3.Connection,
+    zone_id: str,
+    change_id: str,
+    submitted_at: str,
+) -> None:
     with db:
         db.execute(
             """
@@ -295,14 +423,6 @@ async def delete_hosted_zone(
             [change_id, submitted_at, "deleting zone"],
         )
 
-    return {
-        "ChangeInfo": {
-            "Id": change_id,
-            "Status": "INSYNC",
-            "SubmittedAt": submitted_at,
-        },
-    }
-
 
 @route53_handler(
     "ListHostedZones",
@@ -313,14 +433,15 @@ async def list_hosted_zones(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
             "libvirt network does not define a domain"
         )
 
-    subzones = _get_subzones(app)
+    subzones = await _get_subzones(app)
+    counts = net.get_all_dns_record_counts({z[1] for z in subzones})
 
     zones = [
         {
@@ -330,7 +451,7 @@ async def list_hosted_zones(
                 "Comment": "libvirt network zone",
                 "PrivateZone": False,
             },
-            "ResourceRecordSetCount": len(_get_records("", net, app)),
+            "ResourceRecordSetCount": counts[""],
         }
     ]
 
@@ -345,7 +466,7 @@ async def list_hosted_zones(
                 "Id": f"/hostedzone/{zone[0]}",
                 "Name": zone[1],
                 "Config": config,
-                "ResourceRecordSetCount": len(_get_records(zone[1], net, app)),
+                "ResourceRecordSetCount": counts[zone[1]],
             },
         )
 
@@ -364,7 +485,7 @@ async def list_hosted_zones_by_name(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
@@ -388,13 +509,8 @@ async def list_hosted_zones_by_name(
     else:
         max_items = 100
 
-    def _name_key(name: str) -> str:
-        return ".".join(reversed(name.split(".")))
-
-    def _sort_key(zone: Dict[str, Any]) -> str:
-        return _name_key(zone["Name"])
-
-    subzones = _get_subzones(app)
+    subzones = await _get_subzones(app)
+    counts = net.get_all_dns_record_counts({z[1] for z in subzones})
 
     zones = [
         {
@@ -404,7 +520,7 @@ async def list_hosted_zones_by_name(
                 "Comment": "libvirt network zone",
                 "PrivateZone": False,
             },
-            "ResourceRecordSetCount": len(_get_records("", net, app)),
+            "ResourceRecordSetCount": counts[""],
         }
     ]
 
@@ -419,19 +535,24 @@ async def list_hosted_zones_by_name(
                 "Id": f"/hostedzone/{zone[0]}",
                 "Name": zone[1],
                 "Config": config,
-                "ResourceRecordSetCount": len(_get_records(zone[1], net, app)),
+                "ResourceRecordSetCount": counts[zone[1]],
             },
         )
 
-    zones.sort(key=_sort_key)
+    # Compute the sort keys once, they are needed again for bisection.
+    decorated = sorted(
+        ((_name_key(z["Name"]), z) for z in zones),
+        key=operator.itemgetter(0),
+    )
+    zones = [z for _, z in decorated]
     if dns_name:
-        names = [_sort_key(z) for z in zones]
+        names = [k for k, _ in decorated]
         offset = bisect.bisect_left(names, _name_key(dns_name))
     else:
         offset = 0
 
     sliced = zones[offset : offset + max_items]
-    is_truncated = len(zones[offset:]) > max_items
+    is_truncated = len(zones) - offset > max_items
 
     response = {
         "HostedZones": sliced,
@@ -473,35 +594,36 @@ async def list_tags_for_resource(
     if not res_id:
         raise _routing.InvalidParameterError("missing required ResourceId")
 
-    with app["db"]:
-        cur = app["db"].execute(
-            f"""
-                SELECT
-                    tagname, tagvalue
-                FROM
-                    tags
-                WHERE
-                    resource_type = ?  AND resource_name = ?
-            """,
-            [res_type, res_id],
-        )
-        tags = cur.fetchall()
+    tags = await app["db_pool"].run(_fetch_tags, res_type, res_id)
 
     return {
         "ResourceTagSet": {
             "ResourceId": res_id,
             "ResourceType": res_type,
-            "Tags": [
-                {
-                    "Key": tag[0],
-                    "Value": tag[1],
-                }
-                for tag in tags
-            ],
+            "Tags": tags,
         }
     }
 
 
+def _fetch_tags(
+    db: sqlite3.Connection,
+    res_type: str,
+    res_id: str,
+) -> List[Dict[str, str]]:
+    cur = db.execute(
+        f"""
+            SELECT
+                tagname, tagvalue
+            FROM
+                tags
+            WHERE
+                resource_type = ?  AND resource_name = ?
+        """,
+        [res_type, res_id],
+    )
+    return [{"Key": name, "Value": value} for name, value in cur]
+
+
 @route53_handler(
     "ChangeTagsForResource",
     path="/2013-04-01/tags/{ResourceType}/{ResourceId}",
@@ -511,7 +633,6 @@ async def change_tags_for_resource(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
     res_type = args.get("ResourceType")
     if not res_type:
         raise _routing.InvalidParameterError("missing required ResourceType")
@@ -525,49 +646,53 @@ async def change_tags_for_resource(
     if not res_id:
         raise _routing.InvalidParameterError("missing required ResourceId")
 
-    if res_id != net.name:
-        _get_subzone(res_id, app)
-
-    parsed = xmltodict.parse(args["BodyText"])
+    # virNetwork.name() is answered locally, no need for the full XML.
+    if res_id != app["libvirt_net"].name():
+        await _get_subzone(res_id, app)
 
-    try:
-        request = parsed["ChangeTagsForResourceRequest"]
-    except KeyError:
-        raise InvalidInputError("input is not valid") from None
+    request = _parse_request(args["BodyText"], "ChangeTagsForResourceRequest")
 
-    tags_to_update = []
-    tags_to_remove = []
+    tags_to_update: List[Tuple[str, Optional[str]]] = []
+    tags_to_remove: List[Optional[str]] = []
 
-    add_tags = request.get("AddTags")
-    if add_tags:
-        tags = add_tags.get("Tag")
+    add_tags = request.find("AddTags")
+    if add_tags is not None and len(add_tags):
+        tags = add_tags.findall("Tag")
         if not tags:
-            raise InvalidInputError("input is not valid") from None
+            raise InvalidInputError("input is not valid")
 
-        if not isinstance(tags, list):
-            tags = [tags]
+        for tag in tags:
+            tag_key = tag.findtext("Key")
+            if not tag_key:
+                raise InvalidInputError("input is not valid")
+            tags_to_update.append((tag_key, tag.findtext("Value")))
 
-        tags_to_update = tags
-        for tag in tags_to_update:
-            if not tag.get("Key"):
-                raise InvalidInputError("input is not valid") from None
+    remove_tags = request.find("RemoveTagKeys")
+    if remove_tags is not None and len(remove_tags):
+        tag_keys = remove_tags.findall("Key")
+        if not tag_keys:
+            raise InvalidInputError("input is not valid")
 
-    remove_tags = request.get("RemoveTagKeys")
-    if remove_tags:
-        tags = remove_tags.get("Key")
-        if not tags:
-            raise InvalidInputError("input is not valid") from None
+        tags_to_remove = [el.text for el in tag_keys]
+
+    await app["db_writer"].run(
+        _change_tags, res_type, res_id, tags_to_update, tags_to_remove
+    )
 
-        if not isinstance(tags, list):
-            tags = [tags]
+    return {}
 
-        tags_to_remove = tags
 
-    db = app["db"]
+def _change_tags(
+    db: sqlite3.Connection,
+    res_type: str,
+    res_id: str,
+    tags_to_update: List[Tuple[str, Optional[str]]],
+    tags_to_remove: List[Optional[str]],
+) -> None:
     with db:
-        for tag in tags_to_update:
-            db.execute(
-                f"""
+        if tags_to_update:
+            db.executemany(
+                """
                     INSERT INTO tags
                         (resource_name, resource_type, tagname, tagvalue)
                     VALUES
@@ -577,23 +702,24 @@ async def change_tags_for_resource(
                     DO UPDATE
                         SET tagvalue = excluded.tagvalue
                 """,
-                [res_id, res_type, tag["Key"], tag["Value"]],
+                (
+                    (res_id, res_type, key, value)
+                    for key, value in tags_to_update
+                ),
             )
 
-        for tag in tags_to_remove:
-            db.execute(
-                f"""
+        if tags_to_remove:
+            db.executemany(
+                """
                     DELETE FROM tags
                     WHERE
                         resource_name = ?
                         AND resource_type = ?
                         AND tagname = ?
                 """,
-                [res_id, res_type, tag],
+                ((res_id, res_type, tagname) for tagname in tags_to_remove),
             )
 
-    return {}
-
 
 @route53_handler(
     "GetHostedZone",
@@ -608,13 +734,16 @@ async def get_hosted_zone(
     if not zone_id:
         raise _routing.InvalidParameterError("missing required Id")
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
             "libvirt network does not define a domain"
         )
 
+    subzones = await _get_subzones(app)
+    counts = net.get_all_dns_record_counts({z[1] for z in subzones})
+
     if zone_id == net.name:
         zone = {
             "Id": f"/hostedzone/{zone_id}",
@@ -623,10 +752,10 @@ async def get_hosted_zone(
                 "Comment": "libvirt network zone",
                 "PrivateZone": False,
             },
-            "ResourceRecordSetCount": len(_get_records("", net, app)),
+            "ResourceRecordSetCount": counts[""],
         }
     else:
-        zone_tuple = _get_subzone(zone_id, app)
+        zone_tuple = await _get_subzone(zone_id, app)
         zone = {
             "Id": f"/hostedzone/{zone_tuple[0]}",
             "Name": zone_tuple[1],
@@ -634,9 +763,7 @@ async def get_hosted_zone(
                 "Comment": zone_tuple[2],
                 "PrivateZone": False,
             },
-            "ResourceRecordSetCount": len(
-                _get_records(zone_tuple[1], net, app)
-            ),
+            "ResourceRecordSetCount": counts[zone_tuple[1]],
         }
 
     return {
@@ -664,7 +791,7 @@ async def list_resource_record_sets(
     type = args.get("type")
     limit = args.get("maxitems")
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
@@ -674,36 +801,34 @@ async def list_resource_record_sets(
     if zone_id == net.name:
         zone_name = domain
     else:
-        zone_name = _get_subzone(zone_id, app)[1]
+        zone_name = (await _get_subzone(zone_id, app))[1]
 
-    def _name_key(name: str) -> str:
-        return ".".join(reversed(name.split(".")))
+    if type and not name:
+        raise InvalidInputError("cannot specify Type without Name")
 
-    def _sort_key(rec: Tuple[Tuple[str, str], Set[str]]) -> Tuple[str, str]:
-        type, name = rec[0]
-        return (type, _name_key(name))
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise InvalidInputError("invalid MaxItems value")
+        if limit == 0:
+            return {"ResourceRecordSets": [], "IsTruncated": "false"}
 
-    records = list(_get_records(zone_name, net, app).items())
-    records.sort(key=_sort_key)
+    subzone_names = frozenset(z[1] for z in await _get_subzones(app))
+    keys, names, records = _sorted_records(net, zone_name, subzone_names)
 
     if name and type:
-        keys = [_sort_key(r) for r in records]
         offset = bisect.bisect_left(keys, (type, _name_key(name)))
     elif name:
-        names = [_sort_key(r)[1] for r in records]
         offset = bisect.bisect_left(names, _name_key(name))
-    elif type:
-        raise InvalidInputError("cannot specify Type without Name")
     else:
         offset = 0
 
+    if offset >= len(records):
+        return {"ResourceRecordSets": [], "IsTruncated": "false"}
+
     if limit is None:
         limit = len(records)
-    else:
-        try:
-            limit = int(limit)
-        except (TypeError, ValueError):
-            raise InvalidInputError("invalid MaxItems value")
 
     return {
         "ResourceRecordSets": [
@@ -727,12 +852,22 @@ async def list_resource_record_sets(
 async def change_resource_record_sets(
     args: _routing.HandlerArgs,
     app: _routing.App,
+) -> Dict[str, Any]:
+    # The libvirt updates now run off the event loop, so concurrent
+    # batches must not compute their diffs against the same state.
+    async with app["libvirt_net_lock"]:
+        return await _change_resource_record_sets(args, app)
+
+
+async def _change_resource_record_sets(
+    args: _routing.HandlerArgs,
+    app: _routing.App,
 ) -> Dict[str, Any]:
     zone_id = args.get("Id")
     if not zone_id:
         raise _routing.InvalidParameterError("missing required Id")
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     domain = net.dns_domain
     if domain is None:
         raise _routing.InternalServerError(
@@ -740,83 +875,129 @@ async def change_resource_record_sets(
         )
 
     if zone_id != net.name:
-        _get_subzone(zone_id, app)[1]
+        # Only validates that the zone exists.
+        await _get_subzone(zone_id, app)
+
+    # Shallow copy: changes replace or drop whole value sets and never
+    # modify the cached network's sets in place.
+    table = dict(net.dns_records)
+    comment = ""
+    num_changes = 0
+
+    for path, el in _iterparse_request(args["BodyText"], _CHANGE_BATCH_PATHS):
+        if path == _CHANGE_BATCH_COMMENT:
+            comment = el.text or ""
+            continue
+
+        num_changes += 1
+        action, name, type, values = _parse_change(el)
+        key = (type, objects.fqdn(name))
+        if type in {"CNAME", "NS"}:
+            values = {objects.fqdn(v) for v in values}
+
+        if action == "CREATE":
+            if key in table:
+                raise InvalidChangeBatchError(
+                    f"{name} {type} is already present in the record set"
+                )
+            else:
+                table[key] = values
+        elif action == "DELETE":
+            if table.get(key) == values:
+                table.pop(key)
+            else:
+                raise InvalidChangeBatchError(
+                    f"{name} {type} with specified values is "
+                    f"not present in the record set"
+                )
+        elif action == "UPSERT":
+            table[key] = values
+        else:
+            raise InvalidInputError(f"Action = {action} is not supported")
+
+    if not num_changes:
+        raise InvalidInputError("input is not valid")
 
-    parsed = xmltodict.parse(args["BodyText"])
+    added, removed = net.get_dns_diff(table)
 
     try:
-        request = parsed["ChangeResourceRecordSetsRequest"]
-        comment = request["ChangeBatch"].get("Comment", "")
-        changes_el = request["ChangeBatch"]["Changes"]["Change"]
-        changes = changes_el if isinstance(changes_el, list) else [changes_el]
-    except (TypeError, KeyError, AssertionError):
-        raise InvalidInputError("input is not valid") from None
+        await asyncio.get_running_loop().run_in_executor(
+            None, _apply_dns_diff, app["libvirt_net"], added, removed
+        )
+    finally:
+        # Even a partially applied change makes the cached copy stale.
+        if added or removed:
+            app["libvirt_net_cache"].invalidate()
 
-    table = {k: set(r) for k, r in net.dns_records.items()}
+    change_id = uuid.uuid4().hex
+    submitted_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
 
-    try:
-        for change in changes:
-            rrset = change["ResourceRecordSet"]
-            name = rrset["Name"]
-            type = rrset["Type"]
-            records_el = rrset["ResourceRecords"]["ResourceRecord"]
-            if not isinstance(records_el, list):
-                records_el = [records_el]
-            values = {rec["Value"] for rec in records_el}
-            key = (type, objects.fqdn(name))
-            if type in {"CNAME", "NS"}:
-                values = {objects.fqdn(v) for v in values}
-
-            if change["Action"] == "CREATE":
-                if key in table:
-                    raise InvalidChangeBatchError(
-                        f"{name} {type} is already present in the record set"
-                    )
-                else:
-                    table[key] = values
-            elif change["Action"] == "DELETE":
-                if table.get(key) == values:
-                    table.pop(key)
-                else:
-                    raise InvalidChangeBatchError(
-                        f"{name} {type} with specified values is "
-                        f"not present in the record set"
-                    )
-            elif change["Action"] == "UPSERT":
-                table[key] = values
-            else:
-                raise InvalidInputError(
-                    f"Action = {change['Action']} is not supported"
-                )
+    await app["db_writer"].run(
+        _insert_change, change_id, submitted_at, comment
+    )
 
-    except (KeyError, TypeError):
-        raise InvalidInputError("input is not valid") from None
+    return {
+        "ChangeInfo": {
+            "Comment": comment,
+            "Id": change_id,
+            "Status": "INSYNC",
+            "SubmittedAt": submitted_at,
+        },
+    }
 
-    added, removed = net.get_dns_diff(table)
 
+def _apply_dns_diff(
+    net: libvirt.virNetwork,
+    added: List[Tuple[str, str]],
+    removed: List[Tuple[str, str]],
+) -> None:
+    # Removals go first, a changed record is removed and then re-added.
     for typ, xml in removed:
-        section = f"VIR_NETWORK_SECTION_DNS_{typ.upper()}"
         _net_update(
-            app["libvirt_net"],
+            net,
             libvirt.VIR_NETWORK_UPDATE_COMMAND_DELETE,
-            getattr(libvirt, section),
+            _DNS_SECTIONS[typ],
             xml,
         )
 
     for typ, xml in added:
-        section = f"VIR_NETWORK_SECTION_DNS_{typ.upper()}"
         _net_update(
-            app["libvirt_net"],
+            net,
             libvirt.VIR_NETWORK_UPDATE_COMMAND_ADD_LAST,
-            getattr(libvirt, section),
+            _DNS_SECTIONS[typ],
             xml,
         )
 
-    change_id = str(uuid.uuid4()).replace("-", "")
-    submitted_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
 
-    with app["db"]:
-        app["db"].execute(
+def _parse_change(
+    change: ElementTree.Element,
+) -> Tuple[str, str, str, Set[str]]:
+    action = _required_text(change, "Action")
+    rrset = change.find("ResourceRecordSet")
+    if rrset is None:
+        raise InvalidInputError("input is not valid")
+    name = _required_text(rrset, "Name")
+    type = _required_text(rrset, "Type")
+    # Single-tag lookups stay in C, unlike multi-step paths which
+    # go through ElementPath.
+    records_parent = rrset.find("ResourceRecords")
+    if records_parent is None:
+        raise InvalidInputError("input is not valid")
+    records_el = records_parent.findall("ResourceRecord")
+    if not records_el:
+        raise InvalidInputError("input is not valid")
+    values = {_required_text(rec, "Value") for rec in records_el}
+    return action, name, type, values
+
+
+def _insert_change(
+    db: sqlite3.Connection,
+    change_id: str,
+    submitted_at: str,
+    comment: str,
+) -> None:
+    with db:
+        db.execute(
             f"""
                 INSERT INTO dns_changes (id, submitted_at, comment)
                 VALUES (?, ?, ?)
@@ -824,15 +1005,6 @@ async def change_resource_record_sets(
             [change_id, submitted_at, comment],
         )
 
-    return {
-        "ChangeInfo": {
-            "Comment": comment,
-            "Id": change_id,
-            "Status": "INSYNC",
-            "SubmittedAt": submitted_at,
-        },
-    }
-
 
 @route53_handler(
     "GetChange",
@@ -847,19 +1019,9 @@ async def get_change(
     if not change_id:
         raise _routing.InvalidParameterError("missing required Id")
 
-    with app["db"]:
-        cur = app["db"].execute(
-            f"""
-            SELECT id, submitted_at, comment
-            FROM dns_changes
-            WHERE id = ?
-        """,
-            [change_id],
-        )
-
-        rec = cur.fetchone()
-        if not rec:
-            raise NoSuchChangeError(f"no such change: {change_id}")
+    rec = await app["db_pool"].run(_fetch_change, change_id)
+    if not rec:
+        raise NoSuchChangeError(f"no such change: {change_id}")
 
     return {
         "ChangeInfo": {
@@ -871,6 +1033,37 @@ async def get_change(
     }
 
 
+def _fetch_change(
+    db: sqlite3.Connection,
+    change_id: str,
+) -> Optional[Tuple[str, str, str]]:
+    cur = db.execute(
+        f"""
+        SELECT id, submitted_at, comment
+        FROM dns_changes
+        WHERE id = ?
+    """,
+        [change_id],
+    )
+    rec: Optional[Tuple[str, str, str]] = cur.fetchone()
+    return rec
+
+
+_DNS_SECTIONS = {
+    "host": libvirt.VIR_NETWORK_SECTION_DNS_HOST,
+    "srv": libvirt.VIR_NETWORK_SECTION_DNS_SRV,
+    "txt": libvirt.VIR_NETWORK_SECTION_DNS_TXT,
+}
+
+
+# The library version cannot change while the process is running, so
+# look it up once rather than on every network update.
+@functools.lru_cache(maxsize=1)
+def _swap_update_args() -> bool:
+    version: int = libvirt.getVersion("QEMU")[1]
+    return version < 7002000
+
+
 # Work around the issue in libvirt <7.2.0 where NetworkUpdate arguments
 # were incorrectly swapped on the client side.
 #
@@ -882,60 +1075,85 @@ def _net_update(
     section: int,
     xml: str,
 ) -> None:
-    if libvirt.getVersion("QEMU")[1] < 7002000:
+    if _swap_update_args():
         net.update(section, command, -1, xml)
     else:
         net.update(command, section, -1, xml)
 
 
-def _get_subzones(
+async def _get_subzones(
     app: _routing.App,
 ) -> List[Zone]:
-    with app["db"]:
-        cur = app["db"].execute(
-            f"""
-                SELECT
-                    id, name, comment
-                FROM
-                    dns_zones
-            """,
-        )
-        return cur.fetchall()  # type: ignore [no-any-return]
+    subzones: List[Zone] = await app["db_pool"].run(_fetch_subzones)
+    return subzones
 
 
-def _get_subzone(
+def _fetch_subzones(
+    db: sqlite3.Connection,
+) -> List[Zone]:
+    cur = db.execute(
+        f"""
+            SELECT
+                id, name, comment
+            FROM
+                dns_zones
+        """,
+    )
+    subzones: List[Zone] = cur.fetchall()
+    return subzones
+
+
+async def _get_subzone(
     zone_id: str,
     app: _routing.App,
 ) -> Zone:
-    with app["db"]:
-        cur = app["db"].execute(
-            f"""
-                SELECT
-                    id, name, comment
-                FROM
-                    dns_zones
-                WHERE
-                    id = ?
-            """,
-            [zone_id],
-        )
-        zone_tuple = cur.fetchone()
-        if zone_tuple is None:
-            raise NoSuchHostedZoneError(f"zone {zone_id} does not exist")
+    zone_tuple: Optional[Zone] = await app["db_pool"].run(
+        _fetch_subzone, zone_id
+    )
+    if zone_tuple is None:
+        raise NoSuchHostedZoneError(f"zone {zone_id} does not exist")
+
+    return zone_tuple
+
+
+def _fetch_subzone(
+    db: sqlite3.Connection,
+    zone_id: str,
+) -> Optional[Zone]:
+    cur = db.execute(
+        f"""
+            SELECT
+                id, name, comment
+            FROM
+                dns_zones
+            WHERE
+                id = ?
+        """,
+        [zone_id],
+    )
+    zone_tuple: Optional[Zone] = cur.fetchone()
+    return zone_tuple
+
+
+# Like _get_subzone(), for callers that need all the subzones anyway.
+def _find_subzone(
+    zone_id: str,
+    subzones: List[Zone],
+) -> Zone:
+    for zone_tuple in subzones:
+        if zone_tuple[0] == zone_id:
+            return zone_tuple
 
-    return zone_tuple  # type: ignore [no-any-return]
+    raise NoSuchHostedZoneError(f"zone {zone_id} does not exist")
 
 
 def _get_records(
     zone_name: str,
     net: objects.Network,
-    app: _routing.App,
+    subzone_names: Set[str],
     *,
     include_soa_ns: bool = True,
 ) -> objects.DNSRecords:
-    subzones = _get_subzones(app)
-    subzone_names = {z[1] for z in subzones}
-
     return net.get_dns_records(
         zone=zone_name,
         exclude_zones={
@@ -943,3 +1161,39 @@ def _get_records(
         },
         include_soa_ns=include_soa_ns,
     )
+
+
+RecordKey = Tuple[str, str]
+SortedRecords = Tuple[
+    List[RecordKey],
+    List[str],
+    List[Tuple[RecordKey, Set[str]]],
+]
+
+
+# The zone's record sets in ListResourceRecordSets order, along with the
+# sort keys to bisect on.  Cached per Network instance, which gets
+# replaced whenever the libvirt network is updated through us.  The
+# result is shared between requests and must not be modified.
+@functools.lru_cache(maxsize=16)
+def _sorted_records(
+    net: objects.Network,
+    zone_name: str,
+    subzone_names: FrozenSet[str],
+) -> SortedRecords:
+    rrsets = net.get_dns_records(
+        zone=zone_name,
+        exclude_zones={
+            sz for sz in subzone_names if not objects.in_zone(zone_name, sz)
+        },
+        include_soa_ns=True,
+    )
+    decorated = sorted(
+        (
+            ((rtype, _name_key(rname)), ((rtype, rname), values))
+            for (rtype, rname), values in rrsets.items()
+        ),
+        key=operator.itemgetter(0),
+    )
+    keys = [k for k, _ in decorated]
+    return keys, [k[1] for k in keys], [r for _, r in decorated]
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any
 
+import asyncio
+
 import libvirt
 
 from .. import objects
@@ -17,28 +19,21 @@ async def describe_instances(
     app: _routing.App,
 ) -> dict[str, Any]:
     pool: libvirt.virStoragePool = app["libvirt_pool"]
-    net: libvirt.virNetwork = app["libvirt_net"]
+    net: objects.Network = app["libvirt_net_cache"].get()
     lvirt_conn: libvirt.virConnect = app["libvirt"]
 
     instance_ids = set(args.get("InstanceId", ()))
-    result = []
-
-    for domain in objects.get_all_domains(lvirt_conn):
-        domname = domain.name
-        if not instance_ids or domname in instance_ids:
-            block_devices = await _describe_block_devices(pool, domain)
-            network_ifaces = await ips.describe_network_ifaces(
-                lvirt_conn, net, domain
-            )
 
-            result.append(
-                {
-                    "instanceId": domname,
-                    "instanceType": "t2.micro",
-                    "blockDeviceMapping": block_devices,
-                    "networkInterfaceSet": network_ifaces,
-                }
-            )
+    # Filter on the domain name before fetching and parsing the
+    # domain XML.  Interface discovery goes through the guest agent,
+    # so describe the instances concurrently.
+    result = await asyncio.gather(
+        *(
+            _describe_instance(pool, net, virdom)
+            for virdom in lvirt_conn.listAllDomains()
+            if not instance_ids or virdom.name() in instance_ids
+        )
+    )
 
     return {
         "reservationSet": [
@@ -51,14 +46,32 @@ async def describe_instances(
     }
 
 
+async def _describe_instance(
+    pool: libvirt.virStoragePool,
+    net: objects.Network,
+    virdom: libvirt.virDomain,
+) -> dict[str, Any]:
+    domain = objects.domain_from_xml(virdom.XMLDesc(0))
+    block_devices = await _describe_block_devices(pool, domain)
+    network_ifaces = await ips.describe_network_ifaces(virdom, net)
+
+    return {
+        "instanceId": domain.name,
+        "instanceType": "t2.micro",
+        "blockDeviceMapping": block_devices,
+        "networkInterfaceSet": network_ifaces,
+    }
+
+
 async def _describe_block_devices(
     lvirt_pool: libvirt.virStoragePool,
     domain: libvirt.virDomain,
 ) -> list[dict[str, Any]]:
     block_devices = []
     existing = set()
+    pool_name = lvirt_pool.name()
     for disk in domain.disks:
-        if disk.pool != lvirt_pool.name():
+        if disk.pool != pool_name:
             continue
 
         att = disk.attachment
@@ -73,9 +86,9 @@ async def _describe_block_devices(
         )
         existing.add((att.volume, att.domain))
 
-    recent_atts = volumes.get_known_attachments()
-    for (vol, dom), (device, status) in recent_atts.items():
-        if (vol, dom) not in existing and status != "detached":
+    recent_atts = volumes.get_known_attachments_for_domain(domain.name)
+    for vol, (device, status) in recent_atts.items():
+        if (vol, domain.name) not in existing and status != "detached":
             block_devices.append(
                 {
                     "deviceName": f"/dev/{device}",
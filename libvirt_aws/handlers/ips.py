@@ -4,6 +4,8 @@ from typing import (
     Dict,
     FrozenSet,
     List,
+    Optional,
+    Tuple,
 )
 
 import collections
@@ -143,27 +145,9 @@ async def describe_addresses(
     if quals:
         query += f" WHERE {' AND '.join(quals)}"
 
-    with app["db"]:
-        cur = app["db"].execute(query, qargs)
-        addresses = cur.fetchall()
-
-        cur = app["db"].execute(
-            f"""
-                SELECT
-                    resource_name, tagname, tagvalue
-                FROM
-                    tags
-                WHERE
-                    resource_type = 'ip_address'
-                    AND resource_name IN (
-                        {','.join(('?',) * len(addresses))}
-                    )
-            """,
-            [addr[0] for addr in addresses],
-        )
-        addr_tags: Dict[str, Dict[str, str]] = collections.defaultdict(dict)
-        for tag in cur.fetchall():
-            addr_tags[tag[0]][tag[1]] = tag[2]
+    addresses, addr_tags = await app["db_pool"].run(
+        _fetch_addresses, query, qargs
+    )
 
     return {
         "addressesSet": [
@@ -183,6 +167,34 @@ async def describe_addresses(
     }
 
 
+def _fetch_addresses(
+    db: sqlite3.Connection,
+    query: str,
+    qargs: List[Any],
+) -> Tuple[List[Any], Dict[str, Dict[str, str]]]:
+    addresses = db.execute(query, qargs).fetchall()
+
+    cur = db.execute(
+        f"""
+            SELECT
+                resource_name, tagname, tagvalue
+            FROM
+                tags
+            WHERE
+                resource_type = 'ip_address'
+                AND resource_name IN (
+                    {','.join(('?',) * len(addresses))}
+                )
+        """,
+        [addr[0] for addr in addresses],
+    )
+    addr_tags: Dict[str, Dict[str, str]] = collections.defaultdict(dict)
+    for tag in cur.fetchall():
+        addr_tags[tag[0]][tag[1]] = tag[2]
+
+    return addresses, addr_tags
+
+
 @_routing.handler("DescribeAddressesAttribute")
 async def describe_addresses_attribute(
     args: _routing.HandlerArgs,
@@ -211,29 +223,12 @@ async def allocate_address(
             "standard domain is not supported"
         )
 
-    cur = app["db"].cursor()
-    cur.execute(
-        f"""
-        SELECT ip_address FROM ip_addresses
-    """
-    )
-    existing = {ipaddress.IPv4Address(row[0]) for row in cur.fetchall()}
-    cur.close()
-
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
     ip_range_start = int(net.static_ip_range[0])
     ip_range_end = max(
         ip_range_start + PUBLIC_IP_BLOCK_SIZE,
         int(net.static_ip_range[1]),
     )
-    for int_addr in range(ip_range_start, ip_range_end):
-        address = ipaddress.IPv4Address(int_addr)
-        if address not in existing:
-            break
-    else:
-        raise AddressLimitExceededError(
-            "libvirt network is out of static addresses"
-        )
 
     tags = {}
     tag_spec = args.get("TagSpecification")
@@ -243,44 +238,92 @@ async def allocate_address(
             for tag in tag_entries:
                 tags[tag["Key"]] = tag["Value"]
 
-    cur = app["db"].cursor()
-
-    if tags:
-        cur.executemany(
-            """
-                INSERT INTO tags
-                    (resource_name, resource_type, tagname, tagvalue)
-                VALUES (?, ?, ?, ?)
-            """,
-            [[str(address), "ip_address", n, v] for n, v in tags.items()],
-        )
-
     allocation_id = f"eipalloc-{uuid.uuid4()}"
-    cur.execute(
-        """
-            INSERT INTO ip_addresses
-                (allocation_id, ip_address)
-            VALUES (?, ?)
-        """,
-        [allocation_id, str(address)],
+    ip_address = await app["db_writer"].run(
+        _allocate_address, allocation_id, ip_range_start, ip_range_end, tags
     )
 
-    app["db"].commit()
-
     return {
-        "publicIp": str(address),
+        "publicIp": ip_address,
         "domain": "vpc",
         "allocationId": allocation_id,
     }
 
 
+def _allocate_address(
+    db: sqlite3.Connection,
+    allocation_id: str,
+    ip_range_start: int,
+    ip_range_end: int,
+    tags: Dict[str, str],
+) -> str:
+    # Picking the address and inserting it run back to back on the
+    # single writer, so concurrent allocations cannot pick the same one.
+    with db:
+        cur = db.execute(
+            """
+                SELECT ip_address FROM ip_addresses
+            """
+        )
+        existing = {ipaddress.IPv4Address(row[0]) for row in cur.fetchall()}
+
+        for int_addr in range(ip_range_start, ip_range_end):
+            address = ipaddress.IPv4Address(int_addr)
+            if address not in existing:
+                break
+        else:
+            raise AddressLimitExceededError(
+                "libvirt network is out of static addresses"
+            )
+
+        ip_address = str(address)
+
+        if tags:
+            db.executemany(
+                """
+                    INSERT INTO tags
+                        (resource_name, resource_type, tagname, tagvalue)
+                    VALUES (?, ?, ?, ?)
+                """,
+                ((ip_address, "ip_address", n, v) for n, v in tags.items()),
+            )
+
+        db.execute(
+            """
+                INSERT INTO ip_addresses
+                    (allocation_id, ip_address)
+                VALUES (?, ?)
+            """,
+            (allocation_id, ip_address),
+        )
+
+    return ip_address
+
+
+# Looks up the instance and IP of an address by allocation_id or
+# association_id.
+def _fetch_address(
+    db: sqlite3.Connection,
+    id_column: str,
+    id_value: str,
+) -> Optional[Tuple[Optional[str], str]]:
+    cur = db.execute(
+        f"""
+            SELECT instance_id, ip_address
+            FROM ip_addresses
+            WHERE {id_column} = ?
+        """,
+        [id_value],
+    )
+    row: Optional[Tuple[Optional[str], str]] = cur.fetchone()
+    return row
+
+
 @_routing.handler("AssociateAddress")
 async def associate_address(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    pool: libvirt.virStoragePool = app["libvirt_pool"]
-
     alloc_id = args.get("AllocationId")
     if not alloc_id:
         raise _routing.InvalidParameterError("missing required AllocationId")
@@ -289,7 +332,7 @@ async def associate_address(
     if not alloc_id:
         raise _routing.InvalidParameterError("missing required InstanceId")
 
-    vir_conn = pool.connect()
+    vir_conn: libvirt.virConnect = app["libvirt"]
     try:
         new_virdom = vir_conn.lookupByName(instance_id)
     except libvirt.libvirtError as e:
@@ -297,29 +340,17 @@ async def associate_address(
             f"invalid InstanceId: {e}"
         ) from e
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
 
     assoc_id = f"eipassoc-{uuid.uuid4()}"
 
-    db_conn = app["db"]
-
-    with db_conn:
-        cur = db_conn.execute(
-            """
-                SELECT instance_id, ip_address
-                FROM ip_addresses
-                WHERE allocation_id = ?
-            """,
-            [alloc_id],
+    row = await app["db_pool"].run(_fetch_address, "allocation_id", alloc_id)
+    if row is None:
+        raise InvalidAddressID_NotFound(
+            "could not find address for specified AllocationId"
         )
 
-        row = cur.fetchone()
-        if row is None:
-            raise InvalidAddressID_NotFound(
-                "could not find address for specified AllocationId"
-            )
-
-        cur_instance_id, ip_address = row
+    cur_instance_id, ip_address = row
 
     if cur_instance_id is not None:
         try:
@@ -344,8 +375,24 @@ async def associate_address(
             f"could not associate address with instance: {e}"
         ) from e
 
-    with db_conn:
-        db_conn.execute(
+    await app["db_writer"].run(
+        _set_association, alloc_id, assoc_id, instance_id
+    )
+
+    return {
+        "return": "true",
+        "associationId": assoc_id,
+    }
+
+
+def _set_association(
+    db: sqlite3.Connection,
+    alloc_id: str,
+    assoc_id: str,
+    instance_id: str,
+) -> None:
+    with db:
+        db.execute(
             """
                 UPDATE
                     ip_addresses
@@ -358,11 +405,6 @@ async def associate_address(
             [assoc_id, instance_id, alloc_id],
         )
 
-    return {
-        "return": "true",
-        "associationId": assoc_id,
-    }
-
 
 async def _associate_address(
     virdom: libvirt.virDomain,
@@ -465,34 +507,20 @@ async def disassociate_address(
     args: _routing.HandlerArgs,
     app: _routing.App,
 ) -> Dict[str, Any]:
-    pool: libvirt.virStoragePool = app["libvirt_pool"]
-
     assoc_id = args.get("AssociationId")
     if not assoc_id:
         raise _routing.InvalidParameterError("missing required AssociationId")
 
-    db_conn = app["db"]
-
-    with db_conn:
-        cur = db_conn.execute(
-            """
-                SELECT instance_id, ip_address
-                FROM ip_addresses
-                WHERE association_id = ?
-            """,
-            [assoc_id],
+    row = await app["db_pool"].run(_fetch_address, "association_id", assoc_id)
+    if row is None:
+        raise InvalidAssociationID_NotFound(
+            "could not find address for specified AssociationId"
         )
 
-        row = cur.fetchone()
-        if row is None:
-            raise InvalidAssociationID_NotFound(
-                "could not find address for specified AssociationId"
-            )
-
-        cur_instance_id, ip_address = row
+    cur_instance_id, ip_address = row
 
     if cur_instance_id is not None:
-        vir_conn = pool.connect()
+        vir_conn: libvirt.virConnect = app["libvirt"]
 
         try:
             cur_virdom = vir_conn.lookupByName(cur_instance_id)
@@ -507,8 +535,19 @@ async def disassociate_address(
                 ["ip", "addr", "del", ip_address, "dev", "vif0"],
             )
 
-    with db_conn:
-        db_conn.execute(
+    await app["db_writer"].run(_clear_association, assoc_id)
+
+    return {
+        "return": "true",
+    }
+
+
+def _clear_association(
+    db: sqlite3.Connection,
+    assoc_id: str,
+) -> None:
+    with db:
+        db.execute(
             """
                 UPDATE
                     ip_addresses
@@ -521,10 +560,6 @@ async def disassociate_address(
             [assoc_id],
         )
 
-    return {
-        "return": "true",
-    }
-
 
 @_routing.handler("ReleaseAddress")
 async def release_address(
@@ -535,10 +570,19 @@ async def release_address(
     if not alloc_id:
         raise _routing.InvalidParameterError("missing required AllocationId")
 
-    db_conn = app["db"]
+    await app["db_writer"].run(_release_address, alloc_id)
 
-    with db_conn:
-        cur = db_conn.execute(
+    return {
+        "return": "true",
+    }
+
+
+def _release_address(
+    db: sqlite3.Connection,
+    alloc_id: str,
+) -> None:
+    with db:
+        cur = db.execute(
             """
                 SELECT instance_id
                 FROM ip_addresses
@@ -560,7 +604,7 @@ async def release_address(
                 f"call DisassociateAddress first"
             )
 
-        db_conn.execute(
+        db.execute(
             """
                 DELETE FROM
                     tags
@@ -578,7 +622,7 @@ async def release_address(
             [alloc_id],
         )
 
-        db_conn.execute(
+        db.execute(
             """
                 DELETE FROM
                     ip_addresses
@@ -588,10 +632,6 @@ async def release_address(
             [alloc_id],
         )
 
-    return {
-        "return": "true",
-    }
-
 
 @_routing.handler("AssignPrivateIpAddresses")
 async def assign_private_ip_addresses(
@@ -642,14 +682,64 @@ async def assign_private_ip_addresses(
             f"invalid InstanceId: {e}"
         ) from e
 
-    net = objects.network_from_xml(app["libvirt_net"].XMLDesc())
+    net = app["libvirt_net_cache"].get()
+
+    ip_range_start = int(net.static_ip_range[0]) + PUBLIC_IP_BLOCK_SIZE
+    ip_range_end = int(net.static_ip_range[1])
+
+    new_addrs = await app["db_writer"].run(
+        _reserve_private_addresses,
+        instance_id,
+        ifname,
+        addr_count,
+        ip_range_start,
+        ip_range_end,
+    )
+
+    assigned_addrs: List[str] = []
+
+    for new_addr in new_addrs:
+        result = await qemu.agent_exec(
+            vir_domain,
+            ["ip", "addr", "add", new_addr, "dev", ifname],
+        )
+
+        if result.returncode != 0:
+            # Release the whole reservation, the request has failed.
+            await app["db_writer"].run(_delete_private_addresses, new_addrs)
+
+            raise _routing.InternalServerError(
+                f"could not assign address in VM: {result.returncode}\n"
+                f"{result.stderr.read().decode('utf-8', errors='replace')}"
+            )
+        else:
+            assigned_addrs.append(new_addr)
+
+    return {
+        "networkInterfaceId": interface_id,
+        "return": True,
+        "assignedPrivateIpAddressesSet": [
+            {
+                "privateIpAddress": new_addr,
+            }
+            for new_addr in assigned_addrs
+        ],
+        "assignedIpv4PrefixSet": [],
+    }
 
-    db_conn: sqlite3.Connection = app["db"]
 
-    new_addrs = []
+def _reserve_private_addresses(
+    db: sqlite3.Connection,
+    instance_id: str,
+    ifname: str,
+    addr_count: int,
+    ip_range_start: int,
+    ip_range_end: int,
+) -> List[str]:
+    new_addrs: List[str] = []
 
-    with db_conn:
-        cur = db_conn.execute(
+    with db:
+        cur = db.execute(
             """
                 SELECT ip_address
                 FROM private_ip_addresses
@@ -658,17 +748,14 @@ async def assign_private_ip_addresses(
         )
         taken_addrs = {ipaddress.ip_address(row[0]) for row in cur.fetchall()}
 
-        ip_range_start = int(net.static_ip_range[0]) + PUBLIC_IP_BLOCK_SIZE
-        ip_range_end = int(net.static_ip_range[1])
-
         for int_addr in range(ip_range_start, ip_range_end):
             address = ipaddress.IPv4Address(int_addr)
             if address in taken_addrs:
                 continue
 
-            new_addrs.append(address)
+            new_addrs.append(str(address))
 
-            db_conn.execute(
+            db.execute(
                 """
                     INSERT INTO private_ip_addresses(
                         ip_address,
@@ -688,42 +775,22 @@ async def assign_private_ip_addresses(
                 "libvirt network is out of static addresses"
             )
 
-        assigned_addrs = []
-
-        for new_addr in new_addrs:
-            result = await qemu.agent_exec(
-                vir_domain,
-                ["ip", "addr", "add", str(new_addr), "dev", ifname],
-            )
-
-            if result.returncode != 0:
-                placeholders = ", ".join(["?"] * len(assigned_addrs))
-                db_conn.execute(
-                    f"""
-                        DELETE FROM private_ip_addresses
-                        WHERE ip_address IN ({placeholders})
-                    """,
-                    assigned_addrs,
-                )
+    return new_addrs
 
-                raise _routing.InternalServerError(
-                    f"could not assign address in VM: {result.returncode}\n"
-                    f"{result.stderr.read().decode('utf-8', errors='replace')}"
-                )
-            else:
-                assigned_addrs.append(str(new_addr))
 
-    return {
-        "networkInterfaceId": interface_id,
-        "return": True,
-        "assignedPrivateIpAddressesSet": [
-            {
-                "privateIpAddress": new_addr,
-            }
-            for new_addr in assigned_addrs
-        ],
-        "assignedIpv4PrefixSet": [],
-    }
+def _delete_private_addresses(
+    db: sqlite3.Connection,
+    addrs: List[str],
+) -> None:
+    placeholders = ", ".join(["?"] * len(addrs))
+    with db:
+        db.execute(
+            f"""
+                DELETE FROM private_ip_addresses
+                WHERE ip_address IN ({placeholders})
+            """,
+            addrs,
+        )
 
 
 @_routing.handler("UnassignPrivateIpAddresses")
@@ -759,59 +826,59 @@ async def unassign_private_ip_addresses(
             "missing required PrivateIpAddress"
         )
 
-    db_conn: sqlite3.Connection = app["db"]
+    recorded_addrs = await app["db_pool"].run(
+        _fetch_private_addresses, instance_id, ifname, addrs
+    )
+    if len(recorded_addrs) != len(addrs):
+        raise _routing.InvalidParameterError(
+            f"Some of the specified addresses are not assigned to "
+            f"interface {interface_id}"
+        )
 
-    with db_conn:
-        placeholders = ", ".join(["?"] * len(addrs))
-        cur = db_conn.execute(
-            f"""
-                SELECT ip_address
-                FROM private_ip_addresses
-                WHERE
-                    instance_id = ?
-                    AND interface = ?
-                    AND ip_address IN ({placeholders})
-            """,
-            [instance_id, ifname] + addrs,
+    for addr in addrs:
+        result = await qemu.agent_exec(
+            vir_domain,
+            ["ip", "addr", "del", addr, "dev", ifname],
         )
-        recorded_addrs = cur.fetchall()
-        if len(recorded_addrs) != len(addrs):
-            raise _routing.InvalidParameterError(
-                f"Some of the specified addresses are not assigned to "
-                f"interface {interface_id}"
-            )
 
-        for addr in addrs:
-            result = await qemu.agent_exec(
-                vir_domain,
-                ["ip", "addr", "del", addr, "dev", ifname],
+        if result.returncode != 0:
+            raise _routing.InternalServerError(
+                f"could not unassign address in VM: {result.returncode}\n"
+                f"{result.stderr.read().decode('utf-8', errors='replace')}"
             )
 
-            if result.returncode != 0:
-                raise _routing.InternalServerError(
-                    f"could not unassign address in VM: {result.returncode}\n"
-                    f"{result.stderr.read().decode('utf-8', errors='replace')}"
-                )
-            else:
-                db_conn.execute(
-                    f"""
-                        DELETE FROM private_ip_addresses
-                        WHERE ip_address = ?
-                    """,
-                    [addr],
-                )
+    await app["db_writer"].run(_delete_private_addresses, addrs)
 
     return {
         "return": True,
     }
 
 
+def _fetch_private_addresses(
+    db: sqlite3.Connection,
+    instance_id: str,
+    ifname: str,
+    addrs: List[str],
+) -> List[Tuple[str]]:
+    placeholders = ", ".join(["?"] * len(addrs))
+    cur = db.execute(
+        f"""
+            SELECT ip_address
+            FROM private_ip_addresses
+            WHERE
+                instance_id = ?
+                AND interface = ?
+                AND ip_address IN ({placeholders})
+        """,
+        [instance_id, ifname] + addrs,
+    )
+    return cur.fetchall()
+
+
 async def describe_network_ifaces(
-    lvirt_conn: libvirt.virConnect,
-    lvirt_net: libvirt.virNetwork,
-    domain: objects.Domain,
+    vir_domain: libvirt.virDomain,
+    net: objects.Network,
 ) -> list[dict[str, Any]]:
-    vir_domain = lvirt_conn.lookupByName(domain.name)
     if vir_domain.state()[0] != libvirt.VIR_DOMAIN_RUNNING:
         return []
 
@@ -828,10 +895,10 @@ async def describe_network_ifaces(
             f"{result.stderr.read().decode('utf-8', errors='replace')}"
         )
     else:
-        net = objects.network_from_xml(lvirt_net.XMLDesc())
         pub_ip_net = ipaddress.IPv4Interface(
             (int(net.static_ip_range[0]), 32 - PUBLIC_IP_BLOCK_SIZE // 8),
         ).network
+        domname = vir_domain.name()
 
         output = result.stdout.read()
         try:
@@ -860,7 +927,7 @@ async def describe_network_ifaces(
                 # No assigned addresses?  Just skip it.
                 continue
 
-            iface_id = f"{domain.name}::{ifname}"
+            iface_id = f"{domname}::{ifname}"
 
             iface_desc = {
                 "networkInterfaceId": f"eni-{iface_id}",
@@ -6,8 +6,9 @@ import json
 import os.path
 import sqlite3
 import textwrap
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 import uuid
+from xml.sax import saxutils
 
 import libvirt
 
@@ -28,6 +29,52 @@ class InvalidVolumeNotFound(_routing.ClientError):
 
 
 _known_attachments: Dict[Tuple[str, str], Tuple[str, str]] = {}
+# Volume names in _known_attachments, by domain name.
+_known_attachments_by_domain: Dict[str, List[str]] = {}
+
+_attr_entities = {"'": "&apos;", '"': "&quot;"}
+
+_VOLUME_XML = textwrap.dedent(
+    """\
+    <volume type='file'>
+        <name>%(volname)s</name>
+        <capacity unit="G">%(size)s</capacity>
+        <target>
+            <path>%(volname)s</path>
+            <permissions>
+                <mode>0644</mode>
+            </permissions>
+            <format type='qcow2'/>
+            <compat>1.1</compat>
+            <features>
+                <lazy_refcounts/>
+            </features>
+        </target>
+    </volume>"""
+)
+
+_ATTACH_DISK_XML = textwrap.dedent(
+    """\
+    <disk type='volume' device='disk'>
+        <driver name='qemu' type='qcow2'/>
+        <source pool='%(pool)s' volume='%(volume)s' />
+        <target dev='%(device)s' bus='virtio'/>
+        <serial>lvirtebs-%(serial)s</serial>
+    </disk>"""
+)
+
+_DETACH_DISK_XML = textwrap.dedent(
+    """\
+    <disk type='volume' device='disk'>
+        <driver name='qemu' type='qcow2'/>
+        <source pool='%(pool)s' volume='%(volume)s' />
+        <target dev='%(device)s' bus='virtio'/>
+    </disk>"""
+)
+
+
+def _quote_attr(value: str) -> str:
+    return saxutils.escape(value, _attr_entities)
 
 
 @_routing.handler("CreateVolume")
@@ -52,26 +99,18 @@ async def create_volume(
 
     volname = f"{uuid.uuid4()}.qcow2"
 
-    xml = textwrap.dedent(
-        f"""\
-    <volume type='file'>
-        <name>{volname}</name>
-        <capacity unit="G">{size}</capacity>
-        <target>
-            <path>{volname}</path>
-            <permissions>
-                <mode>0644</mode>
-            </permissions>
-            <format type='qcow2'/>
-            <compat>1.1</compat>
-            <features>
-                <lazy_refcounts/>
-            </features>
-        </target>
-    </volume>"""
-    )
+    xml = _VOLUME_XML % {
+        "volname": volname,
+        "size": saxutils.escape(size),
+    }
 
-    pool.createXML(xml, flags=libvirt.VIR_STORAGE_VOL_CREATE_PREALLOC_METADATA)
+    # Storage operations can take a while, keep them off the event loop.
+    await asyncio.get_running_loop().run_in_executor(
+        None,
+        pool.createXML,
+        xml,
+        libvirt.VIR_STORAGE_VOL_CREATE_PREALLOC_METADATA,
+    )
 
     create_time = datetime.datetime.now(datetime.timezone.utc)
 
@@ -84,16 +123,7 @@ async def create_volume(
                 tags[tag["Key"]] = tag["Value"]
 
     if tags:
-        cur = app["db"].cursor()
-        cur.executemany(
-            """
-                INSERT INTO tags
-                    (resource_name, resource_type, tagname, tagvalue)
-                VALUES (?, ?, ?, ?)
-            """,
-            [[volname, "volume", n, v] for n, v in tags.items()],
-        )
-        app["db"].commit()
+        await app["db_writer"].run(_insert_volume_tags, volname, tags)
 
     return {
         "volumeId": volname,
@@ -109,6 +139,38 @@ async def create_volume(
     }
 
 
+def _insert_volume_tags(
+    db: sqlite3.Connection,
+    volname: str,
+    tags: Dict[str, str],
+) -> None:
+    with db:
+        db.executemany(
+            """
+                INSERT INTO tags
+                    (resource_name, resource_type, tagname, tagvalue)
+                VALUES (?, ?, ?, ?)
+            """,
+            ((volname, "volume", n, v) for n, v in tags.items()),
+        )
+
+
+def _fetch_tagged_volumes(
+    db: sqlite3.Connection,
+    tagname: str,
+    tagvalues: List[str],
+) -> List[Tuple[str]]:
+    cur = db.execute(
+        f"""
+        SELECT resource_name FROM tags
+        WHERE tagname = ? AND resource_type = 'volume'
+        AND tagvalue IN ({",".join(["?"] * len(tagvalues))})
+    """,
+        [tagname] + tagvalues,
+    )
+    return cur.fetchall()
+
+
 @_routing.handler("DeleteVolume")
 async def delete_volume(
     args: _routing.HandlerArgs,
@@ -124,7 +186,7 @@ async def delete_volume(
     except libvirt.libvirtError as e:
         raise InvalidVolumeNotFound(e.args[0]) from None
 
-    vol.delete()
+    await asyncio.get_running_loop().run_in_executor(None, vol.delete)
 
     return {
         "return": "true",
@@ -147,17 +209,11 @@ async def describe_volumes(
                 tagname = flt["Name"][len("tag:")]
                 tagvalue = flt["Value"]
 
-                cur = app["db"].cursor()
-                cur.execute(
-                    f"""
-                    SELECT resource_name FROM tags
-                    WHERE tagname = ? AND resource_type = 'volume'
-                    AND tagvalue IN ({",".join(["?"] * len(tagvalue))})
-                """,
-                    [tagname] + list(tagvalue),
+                filtered_volume_ids.update(
+                    await app["db_pool"].run(
+                        _fetch_tagged_volumes, tagname, list(tagvalue)
+                    )
                 )
-                filtered_volume_ids.update(cur.fetchall())
-                cur.close()
             else:
                 raise _routing.InvalidParameterError(
                     f"unsupported filter type: {flt['Name']}"
@@ -207,7 +263,7 @@ async def attach_volume(
             )
         device = device[len("/dev/") :]
 
-    conn = pool.connect()
+    conn: libvirt.virConnect = app["libvirt"]
     try:
         virdom = conn.lookupByName(instance_id)
     except libvirt.libvirtError as e:
@@ -225,15 +281,12 @@ async def attach_volume(
             f"Volume {volume.name} is in use and cannot be attached."
         )
 
-    xml = textwrap.dedent(
-        f"""\
-    <disk type='volume' device='disk'>
-        <driver name='qemu' type='qcow2'/>
-        <source pool='{pool.name()}' volume='{volume_id}' />
-        <target dev='{device}' bus='virtio'/>
-        <serial>lvirtebs-{device}</serial>
-    </disk>"""
-    )
+    xml = _ATTACH_DISK_XML % {
+        "pool": _quote_attr(pool.name()),
+        "volume": _quote_attr(volume_id),
+        "device": _quote_attr(device),
+        "serial": saxutils.escape(device),
+    }
 
     try:
         virdom.attachDevice(xml)
@@ -247,11 +300,11 @@ async def attach_volume(
     dev = device
     for (vol, dom), (_, att_status) in tuple(_known_attachments.items()):
         if vol == volume_id and att_status == "detached":
-            del _known_attachments[vol, dom]
-    _known_attachments[key] = (dev, "attaching")
+            _forget_known_attachment((vol, dom))
+    _set_known_attachment(key, (dev, "attaching"))
 
     def _mark_attached() -> None:
-        _known_attachments[key] = (dev, "attached")
+        _set_known_attachment(key, (dev, "attached"))
 
     asyncio.get_running_loop().call_later(3, _mark_attached)
 
@@ -282,7 +335,7 @@ async def detach_volume(
 
     key = (volume_id, instance_id)
 
-    conn = pool.connect()
+    conn: libvirt.virConnect = app["libvirt"]
     try:
         virdom = conn.lookupByName(instance_id)
     except libvirt.libvirtError as e:
@@ -318,14 +371,11 @@ async def detach_volume(
                 "device": f"/dev/{known[0]}",
             }
 
-    xml = textwrap.dedent(
-        f"""\
-    <disk type='volume' device='disk'>
-        <driver name='qemu' type='qcow2'/>
-        <source pool='{pool.name()}' volume='{volume_id}' />
-        <target dev='{device}' bus='virtio'/>
-    </disk>"""
-    )
+    xml = _DETACH_DISK_XML % {
+        "pool": _quote_attr(pool.name()),
+        "volume": _quote_attr(volume_id),
+        "device": _quote_attr(device),
+    }
 
     try:
         virdom.detachDevice(xml)
@@ -336,10 +386,10 @@ async def detach_volume(
     # no obvious way to actually verify the status of the device in the
     # target VM.
     dev = device
-    _known_attachments[key] = (dev, "detaching")
+    _set_known_attachment(key, (dev, "detaching"))
 
     def _mark_detached() -> None:
-        _known_attachments[key] = (dev, "detached")
+        _set_known_attachment(key, (dev, "detached"))
 
     asyncio.get_running_loop().call_later(3, _mark_detached)
 
@@ -375,6 +425,7 @@ async def modify_volume(
 
     size = args.get("Size")
     if size:
+        loop = asyncio.get_running_loop()
         try:
             size_gb = int(size)
         except ValueError:
@@ -391,7 +442,9 @@ async def modify_volume(
                 if att["status"] == "attached":
                     domain = lvirt_conn.lookupByName(att["instanceId"])
                     try:
-                        domain.blockResize(
+                        await loop.run_in_executor(
+                            None,
+                            domain.blockResize,
                             os.path.basename(att["device"]),
                             size_gb * 2 ** 30,
                             libvirt.VIR_DOMAIN_BLOCK_RESIZE_BYTES,
@@ -408,7 +461,9 @@ async def modify_volume(
             except libvirt.libvirtError as e:
                 raise InvalidVolumeNotFound(f"invalid VolumeId: {e}") from e
             try:
-                virvol.resize(size_gb * 2 ** 30)
+                await loop.run_in_executor(
+                    None, virvol.resize, size_gb * 2 ** 30
+                )
             except libvirt.libvirtError as e:
                 result["modificationState"] = "failed"
                 result["statusMessage"] = str(e)
@@ -420,21 +475,31 @@ async def modify_volume(
     result["modificationState"] = "completed"
     result["progress"] = 100
 
-    with app["db"]:
-        app["db"].execute(
+    await app["db_writer"].run(
+        _store_volume_modification, volume_id, json.dumps(result)
+    )
+
+    return {
+        "volumeModification": result,
+    }
+
+
+def _store_volume_modification(
+    db: sqlite3.Connection,
+    volume_id: str,
+    modification: str,
+) -> None:
+    with db:
+        db.execute(
             """
             INSERT INTO volume_modifications(id, modifications)
             VALUES (?, ?)
             ON CONFLICT (id)
             DO UPDATE SET modifications = EXCLUDED.modifications
             """,
-            (volume_id, json.dumps(result)),
+            (volume_id, modification),
         )
 
-    return {
-        "volumeModification": result,
-    }
-
 
 @_routing.handler("DescribeVolumesModifications")
 async def describe_volumes_modifications(
@@ -443,25 +508,30 @@ async def describe_volumes_modifications(
 ) -> Dict[str, Any]:
     volume_ids = args.get("VolumeId")
 
-    db_conn: sqlite3.Connection = app["db"]
-    with db_conn:
-        placeholders = ", ".join(["?"] * len(volume_ids))
-        cur = db_conn.execute(
-            f"""
-            SELECT modifications
-            FROM volume_modifications
-            WHERE id IN ({placeholders})
-            """,
-            volume_ids,
-        )
-
-        result = [json.loads(row[0]) for row in cur.fetchall()]
+    rows = await app["db_pool"].run(_fetch_volume_modifications, volume_ids)
+    result = [json.loads(row[0]) for row in rows]
 
     return {
         "volumeModificationSet": result,
     }
 
 
+def _fetch_volume_modifications(
+    db: sqlite3.Connection,
+    volume_ids: List[str],
+) -> List[Tuple[str]]:
+    placeholders = ", ".join(["?"] * len(volume_ids))
+    cur = db.execute(
+        f"""
+        SELECT modifications
+        FROM volume_modifications
+        WHERE id IN ({placeholders})
+        """,
+        volume_ids,
+    )
+    return cur.fetchall()
+
+
 def get_attachment_status(att: objects.VolumeAttachment) -> str:
     key = (att.volume, att.domain)
     state = _known_attachments.get(key)
@@ -471,8 +541,33 @@ def get_attachment_status(att: objects.VolumeAttachment) -> str:
         return state[1]
 
 
-def get_known_attachments() -> Dict[Tuple[str, str], Tuple[str, str]]:
-    return _known_attachments
+def get_known_attachments_for_domain(
+    domain: str,
+) -> Dict[str, Tuple[str, str]]:
+    return {
+        vol: _known_attachments[vol, domain]
+        for vol in _known_attachments_by_domain.get(domain, ())
+    }
+
+
+def _set_known_attachment(
+    key: Tuple[str, str],
+    state: Tuple[str, str],
+) -> None:
+    _known_attachments[key] = state
+    vol, dom = key
+    vols = _known_attachments_by_domain.setdefault(dom, [])
+    if vol not in vols:
+        vols.append(vol)
+
+
+def _forget_known_attachment(key: Tuple[str, str]) -> None:
+    del _known_attachments[key]
+    vol, dom = key
+    vols = _known_attachments_by_domain[dom]
+    vols.remove(vol)
+    if not vols:
+        del _known_attachments_by_domain[dom]
 
 
 def _get_volume_status(
@@ -2,6 +2,7 @@ from aiohttp import web
 import aiohttp.abc
 import aiohttp.web_log
 import aiohttp.log
+import asyncio
 import click
 import libvirt
 import logging
@@ -10,7 +11,9 @@ import time
 from typing import Any, Mapping, Optional
 import uuid
 
+from . import db
 from . import handlers
+from . import objects
 
 
 class AccessLogger(aiohttp.web_log.AccessLogger):
@@ -42,7 +45,7 @@ class AccessLogger(aiohttp.web_log.AccessLogger):
                 args = request._post or {}
             else:
                 args = request.query
-            self.logger.debug(f"Request:\n---------\n{args}")
+            self.logger.debug("Request:\n---------\n%s", args)
         except Exception:
             self.logger.exception("Error in logging")
 
@@ -138,12 +141,23 @@ def init_app(
         app["libvirt"], pool_name_or_id, network_name_or_id
     )
 
-    app["db"] = sqlite3.connect(database)
+    app["libvirt_net_cache"] = objects.NetworkCache(app["libvirt_net"])
+
+    app["db"] = db.connect(database)
+    if db.is_file_database(database):
+        app["db_pool"] = db.ConnectionPool(database, readonly=True)
+        # All writes go through here to keep them off the event loop,
+        # SQLite allows a single writer at a time anyway.
+        app["db_writer"] = db.ConnectionPool(database, max_workers=1)
+    else:
+        app["db_pool"] = app["db_writer"] = db.SharedConnection(app["db"])
     app["logger"] = logging.getLogger("libvirt-aws")
     app["region"] = region
     init_db(app["db"])
     app.add_routes(handlers.routes)
+    app.on_startup.append(init_locks)
     app.on_cleanup.append(close_libvirt)
+    app.on_cleanup.append(close_db)
     return app
 
 
@@ -191,10 +205,22 @@ def is_uuid(name_or_id: str) -> bool:
         return True
 
 
+async def init_locks(app: web.Application) -> None:
+    # Created here rather than in init_app() so that the lock belongs to
+    # the loop the application runs on.
+    app["libvirt_net_lock"] = asyncio.Lock()
+
+
 async def close_libvirt(app: web.Application) -> None:
     app["libvirt"].close()
 
 
+async def close_db(app: web.Application) -> None:
+    app["db_pool"].close()
+    app["db_writer"].close()
+    app["db"].close()
+
+
 @click.command()
 @click.option("--bind-to", default=None, type=str, help="Address to listen on")
 @click.option("--port", default=5100, type=int, help="TCP port to listen on")
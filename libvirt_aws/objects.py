@@ -3,6 +3,7 @@ from typing import (
     Any,
     Callable,
     Dict,
+    FrozenSet,
     List,
     Mapping,
     MutableMapping,
@@ -14,7 +15,6 @@ from typing import (
 import collections
 import functools
 import ipaddress
-import types
 
 import libvirt
 import xmltodict
@@ -61,11 +61,12 @@ def get_vol_attachments(
 ) -> List[VolumeAttachment]:
 
     conn = pool.connect()
+    pool_name = pool.name()
     attachments = []
 
     for dom in get_all_domains(conn):
         for disk in dom.disks:
-            if volume.name == disk.volume and disk.pool == pool.name():
+            if volume.name == disk.volume and disk.pool == pool_name:
                 attachments.append(disk.attachment)
 
     return attachments
@@ -191,6 +192,23 @@ def network_from_xml(xml: str) -> Network:
     return Network(xml)
 
 
+# Holds the parsed description of a libvirt network so that it is not
+# fetched from libvirtd on every request.  Whoever changes the network
+# must call invalidate().
+class NetworkCache:
+    def __init__(self, net: libvirt.virNetwork) -> None:
+        self._virnet = net
+        self._net: Optional[Network] = None
+
+    def get(self) -> Network:
+        if self._net is None:
+            self._net = network_from_xml(self._virnet.XMLDesc())
+        return self._net
+
+    def invalidate(self) -> None:
+        self._net = None
+
+
 DNSRecords = MutableMapping[Tuple[str, str], Set[str]]
 
 
@@ -199,11 +217,14 @@ class Network:
         parsed = xmltodict.parse(netxml)
         self._net = parsed["network"]
         self._records: Optional[DNSRecords] = None
+        self._record_counts: Optional[
+            Tuple[FrozenSet[str], Dict[str, int]]
+        ] = None
 
     def dump_xml(self) -> str:
         return xmltodict.unparse(self._net)  # type: ignore [no-any-return]
 
-    @property
+    @functools.cached_property
     def name(self) -> str:
         name = self._net.get("name")
         assert isinstance(name, str)
@@ -223,7 +244,7 @@ class Network:
         else:
             return None
 
-    @property
+    @functools.cached_property
     def dns_domain(self) -> Optional[str]:
         return fqdn(self.domain) if self.domain is not None else None
 
@@ -265,6 +286,59 @@ class Network:
         else:
             filtered_records = self._records
 
+        return self._present_records(
+            filtered_records,
+            zone=zone,
+            include_soa_ns=include_soa_ns,
+            include_eager_cname=include_eager_cname,
+        )
+
+    # Record counts (including SOA and NS) of the network zone, keyed
+    # by "", and of every subzone, in a single pass over the records.
+    # The result for the last set of subzones is kept, since zone
+    # listings are polled far more often than records change.
+    def get_all_dns_record_counts(
+        self,
+        subzones: Set[str],
+    ) -> Dict[str, int]:
+        subzones_key = frozenset(subzones)
+        if self._record_counts is not None:
+            cached_key, cached_counts = self._record_counts
+            if cached_key == subzones_key:
+                return dict(cached_counts)
+
+        if self._records is None:
+            self._records = self._extract_records()
+
+        # Every record belongs to the innermost zone containing it.
+        by_zone: Dict[str, DNSRecords] = {zone: {} for zone in subzones}
+        by_zone[""] = {}
+        for key, v in self._records.items():
+            name = fqdn(key[1])
+            owner = ""
+            while name:
+                if name in subzones:
+                    owner = name
+                    break
+                _, _, name = name.partition(".")
+            by_zone[owner][key] = v
+
+        counts = {
+            zone: len(
+                self._present_records(records, zone=zone, include_soa_ns=True)
+            )
+            for zone, records in by_zone.items()
+        }
+        self._record_counts = (subzones_key, counts)
+        return dict(counts)
+
+    def _present_records(
+        self,
+        filtered_records: DNSRecords,
+        zone: str = "",
+        include_soa_ns: bool = False,
+        include_eager_cname: bool = False,
+    ) -> DNSRecords:
         records: DNSRecords = {}
         for (rt, name), v in filtered_records.items():
             if rt == "TXT" and name.startswith("@@ns."):
@@ -410,6 +484,23 @@ class Network:
                 {"@ip": k, "hostname": v} for k, v in hosts.values()
             ]
 
+    def _get_dns_hosts(self) -> Dict[str, List[str]]:
+        dns = self._net.get("dns")
+        if not dns:
+            return {}
+
+        hosts: Dict[str, List[str]] = collections.defaultdict(list)
+        host_els = dns.get("host", [])
+        if not isinstance(host_els, list):
+            host_els = [host_els]
+        for host in host_els:
+            names = host.get("hostname", [])
+            if not isinstance(names, list):
+                names = [names]
+            hosts[host["@ip"]].extend(names)
+
+        return hosts
+
     def _resolve_cname(self, target: str, records: DNSRecords) -> set[str]:
         fq_target = fqdn(target)
         addrs = records.get(("A", fq_target))
@@ -430,7 +521,6 @@ class Network:
         current_all = self.get_dns_records(include_eager_cname=True)
 
         add_hosts: Dict[str, List[str]] = collections.defaultdict(list)
-        mod_hosts: Set[str] = set()
 
         added: List[Tuple[str, str]] = []
         deleted: List[Tuple[str, str]] = []
@@ -447,7 +537,6 @@ class Network:
             if type in {"A", "AAAA"}:
                 for value in values:
                     add_hosts[value].append(name)
-                mod_hosts.update(prev)
 
             elif type == "CNAME":
                 # Unfortunately, libvirt does not support adding
@@ -458,8 +547,8 @@ class Network:
                     for address in addrs:
                         add_hosts[address].append(name)
 
-                for target in prev:
-                    mod_hosts.update(self._resolve_cname(target, current_all))
+                if values == prev:
+                    continue
 
                 if prev:
                     deleted.append(
@@ -495,6 +584,11 @@ class Network:
                     )
                 )
 
+            elif values == prev:
+                # Host entries are diffed separately below, every other
+                # record type maps to its own elements.
+                continue
+
             elif type == "TXT":
                 for value in prev:
                     deleted.append(
@@ -551,12 +645,7 @@ class Network:
                 )
 
             elif type == "SRV":
-                parts = name.split(".", maxsplit=3)
-                if len(parts) == 2:
-                    service, protocol = parts
-                    domain = None
-                else:
-                    service, protocol, domain = parts
+                service, protocol, domain = _split_srv_name(name)
 
                 for value in prev:
                     priority, weight, port, target = value.split(
@@ -613,6 +702,7 @@ class Network:
                 continue
 
             if type == "SRV":
+                service, protocol, domain = _split_srv_name(name)
                 for value in values:
                     priority, weight, port, target = value.split(
                         " ", maxsplit=4
@@ -663,14 +753,7 @@ class Network:
                         ),
                     )
                 )
-            elif type in {"A", "AAAA"}:
-                mod_hosts.update(values)
             elif type == "CNAME":
-                # Unfortunately, libvirt does not support adding
-                # CNAME records, so we have to do the next best thing:
-                # try to resolve the target and add it as A instead.
-                for target in values:
-                    mod_hosts.update(self._resolve_cname(target, current_all))
                 deleted.append(
                     (
                         "txt",
@@ -687,10 +770,26 @@ class Network:
                         ),
                     )
                 )
-            else:
+            elif type not in {"A", "AAAA"}:
                 raise ValueError(f"unsupported resource record type: {type}")
 
+        # Host entries group all names for an address, so compare them
+        # per address against what the network currently defines and
+        # only rewrite the ones that differ.  The order of names within
+        # an entry follows the record order and carries no meaning, and
+        # names in the network XML may lack the trailing dot.
+        cur_hosts = {
+            addr: sorted(fqdn(h) for h in hosts)
+            for addr, hosts in self._get_dns_hosts().items()
+        }
+        new_hosts = {
+            addr: sorted(fqdn(h) for h in hosts)
+            for addr, hosts in add_hosts.items()
+        }
+
         for addr, hosts in add_hosts.items():
+            if cur_hosts.get(addr) == new_hosts[addr]:
+                continue
             added.append(
                 (
                     "host",
@@ -705,7 +804,9 @@ class Network:
                 )
             )
 
-        for addr in mod_hosts:
+        for addr, hosts in cur_hosts.items():
+            if new_hosts.get(addr) == hosts:
+                continue
             deleted.append(
                 (
                     "host",
@@ -759,6 +860,16 @@ class Network:
         )
 
 
+def _split_srv_name(name: str) -> Tuple[str, str, Optional[str]]:
+    parts = name.split(".", maxsplit=2)
+    if len(parts) == 2:
+        service, protocol = parts
+        domain = None
+    else:
+        service, protocol, domain = parts
+    return service, protocol, domain
+
+
 def fqdn(hostname: str) -> str:
     return f"{hostname}." if not hostname.endswith(".") else hostname
 
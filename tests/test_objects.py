@@ -0,0 +1,43 @@
+import unittest
+
+import xmltodict
+
+from libvirt_aws import objects
+
+
+_SRV_NETWORK_XML = """
+<network>
+  <name>test</name>
+  <domain name="example.com"/>
+  <dns>
+    <srv service="http" protocol="tcp" domain="example.com."
+         target="a.example.com." port="80" priority="1" weight="1"/>
+    <srv service="ldap" protocol="tcp" domain="example.com."
+         target="b.example.com." port="389" priority="1" weight="1"/>
+  </dns>
+</network>
+"""
+
+
+class TestDNSDiff(unittest.TestCase):
+    def test_delete_one_of_two_srv_records(self) -> None:
+        net = objects.Network(_SRV_NETWORK_XML)
+        records = dict(net.get_dns_records())
+        del records["SRV", "_ldap._tcp.example.com."]
+
+        added, deleted = net.get_dns_diff(records)
+
+        self.assertEqual(added, [])
+        self.assertEqual(len(deleted), 1)
+        section, xml = deleted[0]
+        self.assertEqual(section, "srv")
+        srv = xmltodict.parse(xml)["srv"]
+        self.assertEqual(srv["@service"], "_ldap")
+        self.assertEqual(srv["@protocol"], "_tcp")
+        self.assertEqual(srv["@domain"], "example.com.")
+        self.assertEqual(srv["@port"], "389")
+        self.assertEqual(srv["@target"], "b.example.com.")
+
+
+if __name__ == "__main__":
+    unittest.main()